@@ -22,12 +22,20 @@ Light-weight version of Aarhus RE Atlas for converting weather data to power sys
 
 from __future__ import absolute_import
 
+import numpy as np
 import xarray as xr
 
 def aggregate_sum(da):
     return da.sum('time')
 
 def aggregate_matrix(da, matrix, index):
-    da = da.stack(spatial=('y', 'x')).transpose('spatial', 'time')
-    return xr.DataArray(matrix * da,
+    # Flatten (y, x) into one C-contiguous (spatial, time) array, so that
+    # each row of the sparse-dense product reads contiguous memory and no
+    # MultiIndex has to be built by `stack`
+    values = np.ascontiguousarray(da.transpose('y', 'x', 'time').values)
+    values = values.reshape((-1, values.shape[-1]))
+
+    # Call scipy's compiled sparse-dense product directly on the raw array,
+    # rather than letting it dispatch on the DataArray
+    return xr.DataArray(matrix.dot(values),
                         [index, da.coords['time']])
@@ -48,7 +48,7 @@ from .resource import (get_windturbineconfig, get_solarpanelconfig,
                        solarpanel_rated_capacity_per_unit,
                        windturbine_smooth)
 
-from .utils import make_optional_progressbar
+from .utils import make_optional_progressbar, open_cutout_dataset, array_digest
 
 def convert_and_aggregate(cutout, convert_func, matrix=None,
                           index=None, layout=None, shapes=None,
@@ -116,7 +116,7 @@ def convert_and_aggregate(cutout, convert_func, matrix=None,
 
     if layout is not None:
         if isinstance(layout, xr.DataArray):
-            layout = layout.reindex_like(cutout.meta).stack(spatial=('y', 'x')).values
+            layout = layout.reindex_like(cutout.meta).transpose('y', 'x').values
         else:
             assert layout.shape == cutout.shape
         matrix = (layout.reshape((1,-1))
@@ -148,10 +148,24 @@ def convert_and_aggregate(cutout, convert_func, matrix=None,
 
     maybe_progressbar = make_optional_progressbar(show_progress, prefix, len(yearmonths))
 
+    view = cutout.meta.attrs.get('view', {})
+    view_grid = None
+
     for ym in maybe_progressbar(yearmonths):
-        with xr.open_dataset(cutout.datasetfn(ym)) as ds:
-            if 'view' in cutout.meta.attrs:
-                ds = ds.sel(**cutout.meta.attrs['view'])
+        with open_cutout_dataset(cutout.datasetfn(ym), chunks=cutout.chunks) as ds:
+            if view:
+                # The monthly datasets normally share the same grid, so the
+                # label lookup is only repeated if the digest of the
+                # coordinates changes
+                grid = tuple(array_digest(ds.indexes[dim].values) for dim in view)
+                if grid != view_grid:
+                    indexers, labels = _view_indexers(ds, view)
+                    view_grid = grid
+                ds = ds.isel(**indexers)
+                if labels:
+                    ds = ds.sel(**labels)
+                assert (ds.sizes['y'], ds.sizes['x']) == cutout.shape, \
+                    "The view selects a different grid than the cutout's meta data"
             da = convert_func(ds, **convert_kwds)
             results.append(aggregate_func(da, **aggregate_kwds).load())
     if 'time' in results[0].coords:
@@ -178,6 +192,22 @@ def convert_and_aggregate(cutout, convert_func, matrix=None,
         return results
 
 
+def _view_indexers(ds, view):
+    """
+    Split a label-based `view` into positional indexers for its slices,
+    which are resolved against the indexes of `ds`, and the remaining
+    labels.
+    """
+    indexers = {}
+    labels = {}
+    for dim, sel in view.items():
+        if isinstance(sel, slice):
+            indexers[dim] = ds.indexes[dim].slice_indexer(sel.start, sel.stop, sel.step)
+        else:
+            labels[dim] = sel
+    return indexers, labels
+
+
 ## temperature
 
 
@@ -225,7 +255,7 @@ def convert_heat_demand(ds, threshold, a, constant, hour_shift):
     threshold += 273.15
     heat_demand = a*(threshold - T)
 
-    heat_demand.values[heat_demand.values < 0.] = 0.
+    heat_demand = heat_demand.clip(min=0.)
 
     return constant + heat_demand
 
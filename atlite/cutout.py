@@ -22,39 +22,95 @@ Light-weight version of Aarhus RE Atlas for converting weather data to power sys
 
 from __future__ import absolute_import
 
-import xarray as xr
 import numpy as np
-import os, sys
+import os
+import importlib
+from collections import OrderedDict
+from functools import wraps
 from six import string_types
 
 import logging
 logger = logging.getLogger(__name__)
 
-from . import config, datasets
+from . import config
 
 from .convert import (convert_and_aggregate, heat_demand, hydro, temperature,
                       wind, pv, runoff, solar_thermal, soil_temperature)
 from .preparation import (cutout_do_task, cutout_prepare,
                           cutout_produce_specific_dataseries,
                           cutout_get_meta, cutout_get_meta_view)
-from .gis import compute_indicatormatrix
+from .gis import compute_indicatormatrix, has_shapely_2
+from .utils import open_cutout_dataset, array_digest
+
+# Grid cells shared between cutouts (and views of them) on the same grid,
+# keyed by the projection and digests of the x and y coordinates. The
+# polygons of a large grid take up a lot of memory, so only a few grids
+# are kept until `Cutout.clear_grid_cells_cache` is called.
+_grid_cells_cache = OrderedDict()
+_grid_cells_cache_size = 4
+
+def _list_dir(path):
+    """
+    Return the set of entry names in the directory `path` or None if it
+    does not exist.
+    """
+    try:
+        with os.scandir(path) as it:
+            return {entry.name for entry in it}
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+def _expand_bounds(params):
+    """Replace `bounds` in `params` in-place by the `xs` and `ys` slices."""
+    if 'bounds' in params:
+        x1, y1, x2, y2 = params.pop('bounds')
+        params.update(xs=slice(x1, x2),
+                      ys=slice(y2, y1))
+
+def _cached(func):
+    """
+    Memoize the return value of a `Cutout` method in the cache of the
+    instance, which is cleared whenever `meta` is replaced.
+    """
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(self):
+        try:
+            return self._cache[name]
+        except KeyError:
+            value = self._cache[name] = func(self)
+            return value
+    return wrapper
 
 class Cutout(object):
     def __init__(self, name=None, cutout_dir=config.cutout_dir, **cutoutparams):
-        self.name = name
+        # Accept path-like names and directories
+        self.name = name = os.fspath(name)
+        self._cache = {}
 
+        self._base_dir = cutout_dir = os.fspath(cutout_dir)
         self.cutout_dir = os.path.join(cutout_dir, name)
         self.prepared = False
+        self.storage_format = cutoutparams.pop('storage_format', 'netcdf')
+        self.chunks = cutoutparams.pop('chunks', None)
 
-        if 'bounds' in cutoutparams:
-            x1, y1, x2, y2 = cutoutparams.pop('bounds')
-            cutoutparams.update(xs=slice(x1, x2),
-                                ys=slice(y2, y1))
+        _expand_bounds(cutoutparams)
 
-        if os.path.isdir(self.cutout_dir):
-            self.meta = meta = xr.open_dataset(self.datasetfn()).stack(**{'year-month': ('year', 'month')})
+        # A single directory listing replaces one stat call per dataset,
+        # which adds up on network file systems
+        entries = _list_dir(self.cutout_dir)
+
+        if entries is not None:
+            if "meta.zarr" in entries:
+                self.storage_format = 'zarr'
+            else:
+                self.storage_format = 'netcdf'
+
+            self.meta = meta = open_cutout_dataset(self.datasetfn()).stack(**{'year-month': ('year', 'month')})
             # check datasets very rudimentarily, series and coordinates should be checked as well
-            if all(os.path.isfile(self.datasetfn(ym)) for ym in meta.coords['year-month'].to_index()):
+            if all(os.path.basename(self.datasetfn(ym)) in entries
+                   for ym in meta.coords['year-month'].to_index()):
                 self.prepared = True
             else:
                 assert False
@@ -80,7 +136,7 @@ class Cutout(object):
                 d.update(cutoutparams)
                 cutoutparams = d
 
-        self.dataset_module = sys.modules['atlite.datasets.' + cutoutparams['module']]
+        self.module = cutoutparams['module']
 
         if not self.prepared:
             if {"xs", "ys", "years"}.difference(cutoutparams):
@@ -88,17 +144,18 @@ class Cutout(object):
             self.meta = self.get_meta(**cutoutparams)
 
     def datasetfn(self, *args):
-        dataset = None
+        # Either no argument for the meta dataset, a (year, month) tuple or
+        # year and month separately
+        dataset = args[0] if len(args) == 1 else args
+        basename = "{}{:0>2}".format(*dataset) if dataset else "meta"
+        ext = ".zarr" if self.storage_format == 'zarr' else ".nc"
+        return os.path.join(self.cutout_dir, basename + ext)
 
-        if len(args) == 2:
-            dataset = args
-        elif len(args) == 1:
-            dataset = args[0]
-        else:
-            dataset = None
-        return os.path.join(self.cutout_dir, ("meta.nc"
-                                              if dataset is None
-                                              else "{}{:0>2}.nc".format(*dataset)))
+    @property
+    def dataset_module(self):
+        # Dataset modules are only imported once they are needed, since
+        # some of them pull in heavy dependencies like cdsapi
+        return importlib.import_module('atlite.datasets.' + self.module)
 
     @property
     def meta_data_config(self):
@@ -109,14 +166,25 @@ class Cutout(object):
         return self.dataset_module.weather_data_config
 
     @property
+    @_cached
     def projection(self):
         return self.dataset_module.projection
 
+    @property
+    def meta(self):
+        return self._meta
+
+    @meta.setter
+    def meta(self, meta):
+        self._meta = meta
+        self._cache = {}
+
     @property
     def coords(self):
         return self.meta.coords
 
     @property
+    @_cached
     def shape(self):
         return len(self.coords["y"]), len(self.coords["x"])
 
@@ -126,28 +194,147 @@ class Cutout(object):
                 list(self.coords["y"].values[[-1, 0]]))
 
 
+    @_cached
     def grid_coordinates(self):
-        xs, ys = np.meshgrid(self.coords["x"], self.coords["y"])
-        return np.asarray((np.ravel(xs), np.ravel(ys))).T
-
-    def grid_cells(self):
-        from shapely.geometry import box
+        xs = self.coords["x"].values
+        ys = self.coords["y"].values
+
+        # Fill a (y, x, 2) view in place to avoid meshgrid's temporaries
+        coords = np.empty((ys.size * xs.size, 2), dtype=np.result_type(xs, ys))
+        grid = coords.reshape((ys.size, xs.size, 2))
+        grid[:, :, 0] = xs
+        grid[:, :, 1] = ys[:, np.newaxis]
+
+        # The array is shared between calls
+        coords.flags.writeable = False
+        return coords
+
+    @_cached
+    def grid_cell_bounds(self):
+        """
+        Bounds of the grid cells as four flat arrays minx, miny, maxx and
+        maxy in the order of `grid_coordinates`.
+        """
         coords = self.grid_coordinates()
         span = (coords[self.shape[1]+1] - coords[0]) / 2
-        return [box(*c) for c in np.hstack((coords - span, coords + span))]
+        lower = coords - span
+        upper = coords + span
+        bounds = (lower[:, 0], lower[:, 1], upper[:, 0], upper[:, 1])
+
+        for b in bounds:
+            b.flags.writeable = False
+        return bounds
+
+    def grid_cells(self):
+        return list(self._grid_cells_array())
+
+    def _grid_cells_array(self):
+        key = (str(self.projection),
+               array_digest(self.coords["x"].values),
+               array_digest(self.coords["y"].values))
+
+        try:
+            cells = _grid_cells_cache.pop(key)
+        except KeyError:
+            minx, miny, maxx, maxy = self.grid_cell_bounds()
+
+            if has_shapely_2:
+                # Construct all boxes in a single vectorized call
+                import shapely
+                cells = shapely.box(minx, miny, maxx, maxy)
+            else:
+                from shapely.geometry import box
+                cells = np.empty(len(minx), dtype=object)
+                cells[:] = list(map(box, minx, miny, maxx, maxy))
+
+            # The array is shared between cutouts
+            cells.flags.writeable = False
+
+            if len(_grid_cells_cache) >= _grid_cells_cache_size:
+                _grid_cells_cache.popitem(last=False)
+
+        _grid_cells_cache[key] = cells
+        return cells
+
+    @staticmethod
+    def clear_grid_cells_cache():
+        """Release the grid cells shared between cutouts."""
+        _grid_cells_cache.clear()
 
     def __repr__(self):
         yearmonths = self.coords['year-month'].to_index()
+        xs = self.coords['x'].values
+        ys = self.coords['y'].values
         return ('<Cutout {} x={:.2f}-{:.2f} y={:.2f}-{:.2f} time={}/{}-{}/{} {}prepared>'
                 .format(self.name,
-                        self.coords['x'].values[0], self.coords['x'].values[-1],
-                        self.coords['y'].values[0], self.coords['y'].values[-1],
+                        xs[0], xs[-1],
+                        ys[0], ys[-1],
                         yearmonths[0][0],  yearmonths[0][1],
                         yearmonths[-1][0], yearmonths[-1][1],
                         "" if self.prepared else "UN"))
 
+    def sel(self, **viewparams):
+        """
+        Return a view into the prepared cutout.
+
+        Accepts the same `xs`, `ys` (or `bounds`), `years` and `months`
+        arguments as the constructor, but derives the view directly from
+        this cutout instead of re-opening it from disk.
+        """
+        assert self.prepared, "Only views into prepared cutouts are supported."
+
+        _expand_bounds(viewparams)
+
+        view = self._view()
+        view.meta = view.get_meta_view(**viewparams)
+        logger.info("Assuming a view into the prepared cutout: %s", view)
+        return view
+
+    def _view(self):
+        # Shallow copy, which does not share the mutable attributes of meta
+        view = self.__class__.__new__(self.__class__)
+        view.__dict__.update(self.__dict__)
+
+        meta = self.meta.copy(deep=False)
+        meta.attrs = dict(meta.attrs)
+        view.meta = meta
+
+        return view
+
+    def __copy__(self):
+        return self._view()
+
+    def __getstate__(self):
+        if not self.prepared:
+            state = self.__dict__.copy()
+            del state['_cache']
+            return state
+
+        # A prepared cutout is re-opened from disk on unpickling, which
+        # keeps pickles small for sending cutouts to worker processes;
+        # copy.deepcopy goes through the same path and re-opens it as well
+        yearmonths = self.coords['year-month'].to_index()
+        years = yearmonths.get_level_values('year')
+        months = yearmonths.get_level_values('month')
+
+        view = self.meta.attrs.get('view', {})
+        return dict(name=self.name,
+                    cutout_dir=self._base_dir,
+                    xs=view.get('x'), ys=view.get('y'),
+                    years=slice(years.min(), years.max()),
+                    months=slice(months.min(), months.max()),
+                    chunks=self.chunks)
+
+    def __setstate__(self, state):
+        if '_meta' in state:
+            self.__dict__.update(state)
+            self._cache = {}
+        else:
+            self.__init__(**state)
+
     def indicatormatrix(self, shapes, shapes_proj='latlong'):
-        return compute_indicatormatrix(self.grid_cells(), shapes, self.projection, shapes_proj)
+        return compute_indicatormatrix(self._grid_cells_array(), shapes, self.projection, shapes_proj,
+                                       orig_bounds=self.grid_cell_bounds())
 
     ## Preparation functions
 
@@ -1,3 +1,11 @@
 from __future__ import absolute_import
 
-from . import cordex, ncep, era5, sarah
+import importlib
+
+# The dataset modules are imported lazily on first access
+_modules = ('cordex', 'ncep', 'era5', 'sarah')
+
+def __getattr__(name):
+    if name in _modules:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -28,10 +28,10 @@ import scipy as sp, scipy.sparse
 from collections import OrderedDict
 from warnings import warn
 from six import string_types, iteritems
-from six.moves import map, range
-from itertools import product
+from six.moves import map
 from functools import partial
 import pyproj
+import shapely
 from shapely.prepared import prep
 from shapely.ops import transform
 import rasterio as rio
@@ -41,6 +41,9 @@ from rasterio.warp import Resampling
 import logging
 logger = logging.getLogger(__name__)
 
+# Shapely 2 provides vectorized geometry functions and a bulk STRtree query
+has_shapely_2 = int(shapely.__version__.split('.')[0]) >= 2
+
 def spdiag(v):
     N = len(v)
     inds = np.arange(N+1, dtype=np.int32)
@@ -85,10 +88,13 @@ def reproject_shapes(shapes, p1, p2):
             raise NotImplementedError("`p1` can only be a RotProj if `p2` is latlong!")
 
     if isinstance(p2, RotProj):
-        shapes = reproject(shapes, p1, 'latlong')
+        shapes = reproject_shapes(shapes, p1, 'latlong')
         reproject_points = p2
     else:
-        reproject_points = partial(pyproj.transform, as_projection(p1), as_projection(p2))
+        reproject_points = _points_transformer(as_projection(p1), as_projection(p2))
+
+    if has_shapely_2:
+        return _reproject_shapes_vectorized(shapes, reproject_points)
 
     def _reproject_shape(shape):
         return transform(reproject_points, shape)
@@ -100,12 +106,61 @@ def reproject_shapes(shapes, p1, p2):
     else:
         return list(map(_reproject_shape, shapes))
 
+def _points_transformer(p1, p2):
+    """
+    Return a function transforming x and y coordinate arrays from `p1` to
+    `p2`, which sets up the PROJ transformation only once.
+    """
+    try:
+        from pyproj import Transformer
+    except ImportError:
+        # pyproj < 2.1
+        return partial(pyproj.transform, p1, p2)
+    return Transformer.from_proj(p1, p2, always_xy=True).transform
+
+def _reproject_shapes_vectorized(shapes, reproject_points):
+    """
+    Reproject `shapes` by passing the coordinates of all shapes to
+    `reproject_points` in a single call using shapely 2.
+    """
+
+    def transform_coords(coords):
+        # z-coordinates are passed through unchanged
+        x, y = reproject_points(coords[:, 0], coords[:, 1])
+        return np.column_stack((x, y) + tuple(coords[:, 2:].T))
+
+    def transform_geoms(geoms):
+        geoms = _as_geometry_array(geoms)
+        has_z = shapely.has_z(geoms)
+        transformed = np.empty_like(geoms)
+        transformed[~has_z] = shapely.transform(geoms[~has_z], transform_coords)
+        transformed[has_z] = shapely.transform(geoms[has_z], transform_coords,
+                                               include_z=True)
+        return transformed
+
+    if isinstance(shapes, pd.Series):
+        # A plain series, since f.ex. the crs of a GeoSeries would be stale
+        return pd.Series(transform_geoms(shapes.values), index=shapes.index,
+                         name=shapes.name)
+    elif isinstance(shapes, dict):
+        return OrderedDict(zip(shapes.keys(), transform_geoms(shapes.values())))
+    else:
+        return list(transform_geoms(shapes))
+
+_reproject_warned = False
+
 def reproject(shapes, p1, p2):
-    warn("reproject has been renamed to reproject_shapes", DeprecationWarning)
+    # Only warn once, since `warn` has to inspect the calling stack frame
+    global _reproject_warned
+    if not _reproject_warned:
+        warn("reproject has been renamed to reproject_shapes", DeprecationWarning,
+             stacklevel=2)
+        _reproject_warned = True
     return reproject_shapes(shapes, p1, p2)
 reproject.__doc__ = reproject_shapes.__doc__
 
-def compute_indicatormatrix(orig, dest, orig_proj='latlong', dest_proj='latlong'):
+def compute_indicatormatrix(orig, dest, orig_proj='latlong', dest_proj='latlong',
+                            orig_bounds=None):
     """
     Compute the indicatormatrix
 
@@ -122,22 +177,33 @@ def compute_indicatormatrix(orig, dest, orig_proj='latlong', dest_proj='latlong'
     ---------
     orig : Collection of shapely polygons
     dest : Collection of shapely polygons
+    orig_bounds : tuple of arrays, optional
+      Bounds of the rectangles `orig` as the four arrays minx, miny, maxx
+      and maxy (like `Cutout.grid_cell_bounds`), so that they do not have
+      to be collected from the polygons.
 
     Returns
     -------
-    I : sp.sparse.lil_matrix
+    I : sp.sparse.csr_matrix
       Indicatormatrix
     """
 
     dest = reproject_shapes(dest, dest_proj, orig_proj)
+
+    if has_shapely_2:
+        return _compute_indicatormatrix_vectorized(orig, dest, orig_bounds)
+
+    if orig_bounds is None:
+        orig_bounds = np.array([o.bounds for o in orig]).reshape((-1, 4)).T
+
     indicator = sp.sparse.lil_matrix((len(dest), len(orig)), dtype=np.float)
 
     try:
         from rtree.index import Index
 
         idx = Index()
-        for j, o in enumerate(orig):
-            idx.insert(j, o.bounds)
+        for j, b in enumerate(zip(*orig_bounds)):
+            idx.insert(j, b)
 
         for i, d in enumerate(dest):
             for j in idx.intersection(d.bounds):
@@ -148,12 +214,54 @@ def compute_indicatormatrix(orig, dest, orig_proj='latlong', dest_proj='latlong'
     except ImportError:
         logger.warning("Rtree is not available. Falling back to slower algorithm.")
 
-        dest_prepped = list(map(prep, dest))
+        for i, d in enumerate(dest):
+            d_prepped = prep(d)
+            for j in np.flatnonzero(_bounds_intersect(orig_bounds, d.bounds)):
+                if d_prepped.intersects(orig[j]):
+                    area = d.intersection(orig[j]).area
+                    indicator[i,j] = area/orig[j].area
+
+    return indicator.tocsr()
+
+def _bounds_intersect(bounds, bbox):
+    """
+    Determine which of the bounding boxes `bounds`, given as the arrays
+    minx, miny, maxx and maxy, intersect the bounding box `bbox`.
+    """
+    minx, miny, maxx, maxy = bounds
+    bminx, bminy, bmaxx, bmaxy = bbox
+    return np.logical_and.reduce((minx <= bmaxx, maxx >= bminx,
+                                  miny <= bmaxy, maxy >= bminy))
+
+def _as_geometry_array(shapes):
+    if isinstance(shapes, np.ndarray) and shapes.dtype == object:
+        return shapes
+    geoms = np.empty(len(shapes), dtype=object)
+    geoms[:] = list(shapes)
+    return geoms
+
+def _compute_indicatormatrix_vectorized(orig, dest, orig_bounds=None):
+    """
+    Compute the indicatormatrix with a single bulk query of an STRtree
+    and the vectorized intersection and area functions of shapely 2.
+    """
+
+    orig = _as_geometry_array(orig)
+    dest = _as_geometry_array(dest)
+
+    tree = shapely.STRtree(orig)
+    i, j = tree.query(dest, predicate='intersects')
+
+    if orig_bounds is None:
+        orig_area = shapely.area(orig[j])
+    else:
+        minx, miny, maxx, maxy = orig_bounds
+        orig_area = ((maxx - minx) * (maxy - miny))[j]
 
-        for i,j in product(range(len(dest)), range(len(orig))):
-            if dest_prepped[i].intersects(orig[j]):
-                area = dest[i].intersection(orig[j]).area
-                indicator[i,j] = area/orig[j].area
+    area = shapely.area(shapely.intersection(dest[i], orig[j]))
+    indicator = sp.sparse.csr_matrix((area / orig_area, (i, j)),
+                                     shape=(len(dest), len(orig)))
+    indicator.eliminate_zeros()
 
     return indicator
 
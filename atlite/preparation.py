@@ -35,11 +35,15 @@ from six import itervalues
 from six.moves import map
 from multiprocessing import Pool
 
+from .utils import (open_cutout_dataset, write_cutout_dataset,
+                    remove_cutout_dataset)
+
 logger = logging.getLogger(__name__)
 
 def cutout_do_task(task, write_to_file=True):
     task = task.copy()
     prepare_func = task.pop('prepare_func')
+    pack = task.pop('pack', False)
     if write_to_file:
         datasetfns = task.pop('datasetfns')
 
@@ -55,8 +59,10 @@ def cutout_do_task(task, write_to_file=True):
                     ## TODO : rewrite using plain netcdf4 to add variables
                     ## to the same file one by one
                     fn = datasetfns[yearmonth]
+                    if pack:
+                        _pack_int16(ds)
                     logger.debug("Writing to %s", os.path.basename(fn))
-                    ds.to_netcdf(fn)
+                    write_cutout_dataset(ds, fn)
                     logger.debug("Write variable(s) %s to %s generated by %s",
                                 ", ".join(ds.data_vars),
                                 os.path.basename(fn),
@@ -68,7 +74,37 @@ def cutout_do_task(task, write_to_file=True):
                             prepare_func.__name__, e.args[0])
             raise e
 
-def cutout_prepare(cutout, overwrite=False, nprocesses=None, gebco_height=False):
+def _pack_int16(ds):
+    """
+    Set the encoding of all floating point variables in `ds` to store them
+    packed as int16 with a CF `scale_factor` and `add_offset`, which cover
+    the range of values of each variable.
+
+    Packing is lossy: values are rounded to 1/65534 of the range.
+    """
+    names = [name for name in ds.data_vars
+             if np.issubdtype(ds.variables[name].dtype, np.floating)]
+
+    # Lazy variables often share an expensive graph, so compute all ranges
+    # in a single pass
+    ranges = dask.compute(*[(ds[name].min(), ds[name].max()) for name in names])
+
+    for name, (vmin, vmax) in zip(names, ranges):
+        var = ds.variables[name]
+        vmin, vmax = float(vmin), float(vmax)
+        if not (np.isfinite(vmin) and np.isfinite(vmax)):
+            continue
+
+        # xarray decodes to the dtype of scale_factor and add_offset, so
+        # keep float32 variables float32
+        scale = (vmax - vmin) / 65534 or 1.
+        var.encoding.pop('missing_value', None)
+        var.encoding.update(dtype='int16',
+                            scale_factor=var.dtype.type(scale),
+                            add_offset=var.dtype.type(vmin + 32767 * scale),
+                            _FillValue=-32768)
+
+def cutout_prepare(cutout, overwrite=False, nprocesses=None, gebco_height=False, pack=False):
     if cutout.prepared and not overwrite:
         raise ArgumentError("The cutout is already prepared. If you want to recalculate it, "
                             "anyway, then you must supply an `overwrite=True` argument.")
@@ -90,7 +126,7 @@ def cutout_prepare(cutout, overwrite=False, nprocesses=None, gebco_height=False)
         shutil.rmtree(cutout_dir)
 
     os.mkdir(cutout_dir)
-    cutout.meta.unstack('year-month').to_netcdf(cutout.datasetfn())
+    write_cutout_dataset(cutout.meta.unstack('year-month'), cutout.datasetfn())
 
     # Compute data and fill files
     tasks = []
@@ -104,6 +140,7 @@ def cutout_prepare(cutout, overwrite=False, nprocesses=None, gebco_height=False)
             base, ext = os.path.splitext(cutout.datasetfn(ym))
             return base + "-{}".format(i) + ext
         t['datasetfns'] = {ym: datasetfn_with_id(ym) for ym in yearmonths.tolist()}
+        t['pack'] = pack
 
     logger.info("%d tasks have been collected. Starting running them on %s.",
                 len(tasks),
@@ -128,7 +165,9 @@ def cutout_prepare(cutout, overwrite=False, nprocesses=None, gebco_height=False)
     for fn in map(cutout.datasetfn, yearmonths.tolist()):
         base, ext = os.path.splitext(fn)
         fns = glob(base + "-*" + ext)
-        if len(fns) == 1 and not gebco_height:
+        if cutout.storage_format == 'zarr':
+            _merge_zarr_stores(fns, fn, cutout.meta['height'] if gebco_height else None)
+        elif len(fns) == 1 and not gebco_height:
             # Fast-path
             os.rename(fns[0], fn)
         else:
@@ -136,14 +175,50 @@ def cutout_prepare(cutout, overwrite=False, nprocesses=None, gebco_height=False)
                 if gebco_height:
                     ds['height'] = cutout.meta['height']
 
-                ds.to_netcdf(fn)
+                write_cutout_dataset(ds, fn)
 
-            for tfn in fns: os.unlink(tfn)
+            for tfn in fns: remove_cutout_dataset(tfn)
         logger.debug("Completed file %s", os.path.basename(fn))
 
     logger.info("Cutout '%s' has been successfully prepared", cutout.name)
     cutout.prepared = True
 
+def _merge_zarr_stores(fns, fn, height=None):
+    """
+    Merge the zarr stores `fns` written by the individual tasks into `fn`.
+
+    Instead of rewriting all variables into a new store, the first store is
+    moved into place and only the data variables of the remaining ones are
+    appended. Their coordinates have to match the ones of the store.
+    """
+    import zarr
+
+    os.rename(fns[0], fn)
+    with open_cutout_dataset(fn) as target:
+        indexes = dict(target.indexes)
+        names = set(target.variables)
+
+    def append(ds, origin):
+        for dim, index in ds.indexes.items():
+            if dim in indexes and not index.equals(indexes[dim]):
+                raise ValueError("Coordinate `{}` of {} does not match the one in {}"
+                                 .format(dim, origin, fn))
+
+        # Coordinates already in the store must not be overwritten
+        ds = ds.drop([c for c in ds.coords if c in names])
+        write_cutout_dataset(ds, fn, mode='a', consolidated=False)
+        names.update(ds.variables)
+
+    for tfn in fns[1:]:
+        with open_cutout_dataset(tfn) as ds:
+            append(ds, tfn)
+        remove_cutout_dataset(tfn)
+
+    if height is not None:
+        append(height.to_dataset(), "the gebco height")
+
+    zarr.consolidate_metadata(fn)
+
 def cutout_produce_specific_dataseries(cutout, yearmonth, series_name):
     xs = cutout.coords['x']
     ys = cutout.coords['y']
@@ -192,19 +267,27 @@ def cutout_get_meta(cutout, xs, ys, years, months=None, **dataset_params):
 def cutout_get_meta_view(cutout, xs=None, ys=None, years=slice(None), months=slice(None), **dataset_params):
     meta = cutout.meta
 
+    view = {}
     if xs is not None:
-        meta.attrs.setdefault('view', {})['x'] = xs
+        view['x'] = xs
     if ys is not None:
-        meta.attrs.setdefault('view', {})['y'] = ys
+        view['y'] = ys
 
     meta = (meta
             .unstack('year-month')
-            .sel(year=years, month=months, **meta.attrs.get('view', {}))
+            .sel(year=years, month=months, **view)
             .stack(**{'year-month': ('year', 'month')}))
 
     meta = meta.sel(time=slice(*("{:04}-{:02}".format(*ym)
                                  for ym in meta['year-month'][[0,-1]].to_index())))
 
+    # Record the extent of the selected grid rather than the requested
+    # slices, since a view of a view covers only their intersection
+    view = dict(cutout.meta.attrs.get('view', {}), **view)
+    view = {dim: slice(*meta.indexes[dim][[0, -1]]) if isinstance(sel, slice) else sel
+            for dim, sel in view.items()}
+    meta.attrs = dict(meta.attrs, view=view)
+
     return meta
 
 
@@ -91,7 +91,7 @@ def TiltedDiffuseIrrad(ds, solar_position, surface_orientation, direct, diffuse)
             logger.warn('diffuse_t exhibits negative values above altitude threshold.')
 
     with np.errstate(invalid='ignore'):
-        diffuse_t.values[np.isnan(diffuse_t.values) | (diffuse_t.values < 0.)] = 0.
+        diffuse_t = diffuse_t.fillna(0.).clip(min=0.)
 
     return diffuse_t.rename('diffuse tilted')
 
@@ -109,8 +109,7 @@ def _albedo(ds, influx):
         albedo = ds['albedo']
     elif 'outflux' in ds:
         with np.errstate(divide='ignore', invalid='ignore'):
-            albedo = (ds['outflux'] / influx)
-            albedo.values[albedo.values > 1.0] = 1.0
+            albedo = (ds['outflux'] / influx).clip(max=1.0)
     else:
         raise AssertionError("Need either albedo or outflux as a variable in the dataset. Check your cutout and dataset module.")
 
@@ -159,6 +158,6 @@ def TiltedIrradiation(ds, solar_position, surface_orientation, trigon_model, cle
     # => Suppress irradiation below solar altitudes of 1 deg.
 
     cap_alt = solar_position['altitude'] < np.deg2rad(altitude_threshold)
-    total_t.values[(cap_alt | (direct+diffuse <= 0.01)).transpose(*total_t.dims).values] = 0.
+    total_t = total_t.where(~(cap_alt | (direct+diffuse <= 0.01)), 0.)
 
     return total_t
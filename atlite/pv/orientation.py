@@ -90,7 +90,7 @@ def SurfaceOrientation(ds, solar_position, orientation):
     # fixup incidence angle: if the panel is badly oriented and the sun shines
     # on the back of the panel (incidence angle > 90degree), the irradiation
     # would be negative instead of 0; this is prevented here.
-    cosincidence.values[cosincidence.values < 0.] = 0.
+    cosincidence = cosincidence.clip(min=0.)
 
     return xr.Dataset({'cosincidence': cosincidence,
                        'slope': surface_slope,
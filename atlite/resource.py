@@ -25,6 +25,7 @@ from __future__ import absolute_import
 
 import os
 import yaml
+from functools import lru_cache
 from six import string_types
 from operator import itemgetter
 import numpy as np
@@ -34,17 +35,22 @@ from pkg_resources import resource_stream
 import logging
 logger = logging.getLogger(name=__name__)
 
+@lru_cache(maxsize=None)
+def _load_resource(res_name):
+    # The parsed files are shared, callers must hand out copies
+    return yaml.safe_load(resource_stream(__name__, res_name))
+
 def get_windturbineconfig(turbine):
     """Load the 'turbine'.yaml file from local disk and provide a turbine dict."""
 
     res_name = "resources/windturbine/" + turbine + ".yaml"
-    turbineconf = yaml.safe_load(resource_stream(__name__, res_name))
+    turbineconf = _load_resource(res_name)
     V, POW, hub_height = itemgetter('V', 'POW', 'HUB_HEIGHT')(turbineconf)
     return dict(V=np.array(V), POW=np.array(POW), hub_height=hub_height, P=np.max(POW))
 
 def get_solarpanelconfig(panel):
     res_name = "resources/solarpanel/" + panel + ".yaml"
-    return yaml.safe_load(resource_stream(__name__, res_name))
+    return dict(_load_resource(res_name))
 
 def solarpanel_rated_capacity_per_unit(panel):
     # unit is m^2 here
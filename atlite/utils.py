@@ -22,6 +22,11 @@ Renewable Energy Atlas Lite (Atlite)
 Light-weight version of Aarhus RE Atlas for converting weather data to power systems data
 """
 
+import os
+import shutil
+import hashlib
+import numpy as np
+import xarray as xr
 import progressbar as pgb
 
 def make_optional_progressbar(show, prefix, max_value):
@@ -40,3 +45,39 @@ def make_optional_progressbar(show, prefix, max_value):
         maybe_progressbar = lambda x: x
 
     return maybe_progressbar
+
+def open_cutout_dataset(fn, **kwargs):
+    """
+    Open a dataset of a cutout, which is stored either as a netCDF file or,
+    if `fn` ends with `.zarr`, as a consolidated zarr store.
+    """
+    if fn.endswith(".zarr"):
+        # Like open_dataset, only use dask if chunks are given explicitly
+        kwargs.setdefault("chunks", None)
+        return xr.open_zarr(fn, consolidated=True, **kwargs)
+    else:
+        return xr.open_dataset(fn, **kwargs)
+
+def write_cutout_dataset(ds, fn, **kwargs):
+    """
+    Write the dataset `ds` of a cutout to `fn` in the storage format
+    determined by the suffix of `fn` (`.zarr` or `.nc`).
+    """
+    if fn.endswith(".zarr"):
+        kwargs.setdefault("mode", "w")
+        kwargs.setdefault("consolidated", True)
+        return ds.to_zarr(fn, **kwargs)
+    else:
+        return ds.to_netcdf(fn, **kwargs)
+
+def remove_cutout_dataset(fn):
+    """Remove a netCDF file or a zarr store (which is a directory)."""
+    if os.path.isdir(fn):
+        shutil.rmtree(fn)
+    else:
+        os.unlink(fn)
+
+def array_digest(a):
+    """Return a short BLAKE2b digest of the contents of the array `a`."""
+    a = np.ascontiguousarray(a)
+    return hashlib.blake2b(a.tobytes(), digest_size=8).digest()
@@ -77,11 +77,11 @@ def extrapolate_wind_speed(ds, to_height, from_height=None):
 
     # Sanitise roughness for logarithm
     # 0.0002 corresponds to open water [2]
-    ds['roughness'].values[ds['roughness'].values <= 0.0] = 0.0002
+    roughness = ds['roughness'].where(~(ds['roughness'] <= 0.0), 0.0002)
 
     # Wind speed extrapolation
-    wnd_spd = ds[from_name] * ( np.log(to_height /ds['roughness'])
-                              / np.log(from_height/ds['roughness']))
+    wnd_spd = ds[from_name] * ( np.log(to_height /roughness)
+                              / np.log(from_height/roughness))
 
     wnd_spd.attrs.update({"long name":
                             "extrapolated {ht} m wind speed using logarithmic "
@@ -19,6 +19,7 @@ setup(
     url='https://github.com/FRESNA/atlite',
     license='GPLv3',
     packages=find_packages(exclude=['doc', 'test']),
+    python_requires='>=3.7',
     include_package_data=True,
     install_requires=['numpy',
                       'scipy',
@@ -31,11 +32,14 @@ setup(
                       'shapely',
                       'progressbar2',
                       'geopandas'],
+    extras_require={'zarr': ['zarr']},
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Environment :: Console',
         'Intended Audience :: Science/Research',
         'License :: OSI Approved :: GNU General Public License v3 or later (GPLv3+)',
         'Natural Language :: English',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
         'Operating System :: OS Independent',
     ])